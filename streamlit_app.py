@@ -9,8 +9,14 @@
 - Energy: World Bank (https://data.worldbank.org/indicator/EG.USE.PCAP.KG.OE)
 """
 
-import io
+import os
+import time
+import tempfile
+import hashlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -22,65 +28,189 @@ st.set_page_config(page_title="대기 성분 & 에너지 소비량", layout="wid
 
 LOCAL_TZ = ZoneInfo("Asia/Seoul")
 TODAY_LOCAL = datetime.now(LOCAL_TZ).date()
+TODAY_TS = pd.Timestamp(TODAY_LOCAL)
+YEAR2000_TS = pd.Timestamp("2000-01-01")
+
+# ---------- HTTP 세션 (keep-alive 연결 재사용) ----------
+@st.cache_resource
+def get_session():
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20))
+    s.headers.update({"User-Agent": "streamlit-dashboard"})
+    return s
+
+# ---------- 디스크 캐시 (서버 재시작 후에도 유지) ----------
+CACHE_DIR = Path(".cache")
+CACHE_MAX_AGE = 24 * 3600  # 초
+
+def cached_fetch(url, parser, session):
+    """URL의 SHA1 해시로 .cache/<sha1>.parquet 파일을 찾고, 24시간 이내면 그대로 읽음.
+    없거나 오래됐으면 스트리밍으로 받아 parser(response)로 파싱하여 저장."""
+    path = CACHE_DIR / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.parquet"
+    if path.exists() and time.time() - path.stat().st_mtime < CACHE_MAX_AGE:
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            path.unlink(missing_ok=True)  # 깨진 캐시 파일은 지우고 다시 다운로드
+    with session.get(url, timeout=15, stream=True) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True  # gzip 등 전송 인코딩을 풀어서 읽도록
+        df = parser(r)
+    tmp = None
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        # 임시 파일에 쓴 뒤 교체하여 중단/동시 실행 시에도 잘린 파일이 남지 않도록
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        os.close(fd)
+        df.to_parquet(tmp, compression="zstd", index=False)
+        os.replace(tmp, path)
+    except Exception:
+        # 캐시 저장 실패는 무시 (다음 실행에서 다시 다운로드)
+        if tmp is not None:
+            Path(tmp).unlink(missing_ok=True)
+    return df
 
 # ---------- 유틸 ----------
+@st.cache_data(max_entries=32)
+def df_to_csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
 def safe_csv_download(df, fname):
-    return st.download_button("📥 CSV 다운로드", df.to_csv(index=False).encode("utf-8"),
+    return st.download_button("📥 CSV 다운로드", df_to_csv_bytes(df),
                               file_name=fname, mime="text/csv")
 
+def moving_average(values, codes, window):
+    """그룹별 단순 이동 평균 (rolling(window, min_periods=1).mean()과 동일, NaN 무시).
+    같은 그룹의 행이 연속으로 붙어 있다고 가정하고 그룹마다 cumsum 한 번으로 계산."""
+    v = np.asarray(values, dtype=float)
+    out = np.empty_like(v)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(v)]
+    for s, e in zip(starts, ends):
+        seg = v[s:e]
+        valid = ~np.isnan(seg)
+        csum = np.r_[0.0, np.cumsum(np.where(valid, seg, 0.0))]
+        ccnt = np.r_[0, np.cumsum(valid)]
+        i = np.arange(1, e - s + 1)
+        lo = np.maximum(0, i - window)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[s:e] = (csum[i] - csum[lo]) / (ccnt[i] - ccnt[lo])
+    return out
+
+# ---------- 차트용 다운샘플링 (LTTB) ----------
+MAX_POINTS_PER_GROUP = 500  # 차트 폭(px) / 2 정도
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: 모양을 유지하면서 n_out개 점의 인덱스를 고름."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+def downsample(df, n_out=MAX_POINTS_PER_GROUP):
+    parts = []
+    for _, g in df.groupby("group", observed=True, sort=False):
+        x = g["date"].to_numpy().astype("int64").astype(float)
+        y = g["value"].to_numpy(dtype=float)
+        parts.append(g.iloc[lttb_indices(x, y, n_out)])
+    return pd.concat(parts) if parts else df
+
 # ---------- 대기 성분 데이터 ----------
 @st.cache_data(ttl=3600)
 def load_gas_data():
+    session = get_session()  # 캐시된 리소스는 스크립트 스레드에서 꺼내 워커에 넘김
     def fetch(url, names, group_name, default_vals, default_range):
         try:
-            txt = requests.get(url, timeout=15).text
-            df = pd.read_csv(io.StringIO(txt), comment="#", delim_whitespace=True, names=names)
-            if "year" in names and "month" in names:
-                df["date"] = pd.to_datetime(df[["year","month"]].assign(DAY=15))
-            else:
-                df["date"] = pd.to_datetime(df["date"])
-            df = df[["date", names[-1]]].rename(columns={names[-1]:"value"})
+            def parse(r):
+                # 날짜 열과 값 열(names[-1])만 파싱
+                usecols = [n for n in ("year","month","date") if n in names] + [names[-1]]
+                dtype = {"year":"int16", "month":"int8", names[-1]:"float64"}
+                df = pd.read_csv(r.raw, comment="#", sep=r"\s+", engine="c",
+                                 names=names, usecols=usecols,
+                                 dtype={k: v for k, v in dtype.items() if k in usecols})
+                if "year" in names and "month" in names:
+                    ymd = df["year"].astype("int32") * 10000 + df["month"].astype("int32") * 100 + 15
+                    df["date"] = pd.to_datetime(ymd, format="%Y%m%d")
+                else:
+                    df["date"] = pd.to_datetime(df["date"])
+                return df[["date", names[-1]]].rename(columns={names[-1]:"value"})
+            df = cached_fetch(url, parse, session)
             df["group"] = group_name
-            df = df[(df["date"].dt.date <= TODAY_LOCAL) & (df["date"].dt.year >= 2000)]
+            # NOAA 파일은 시간순으로 정렬되어 있으므로 이진 탐색으로 구간만 잘라냄
+            lo = df["date"].searchsorted(YEAR2000_TS, side="left")
+            hi = df["date"].searchsorted(TODAY_TS, side="right")
+            df = df.iloc[lo:hi]
             return df, url
         except:
             years = pd.date_range(default_range[0], default_range[1], freq="M")
             vals = np.linspace(*default_vals,len(years)) + np.random.normal(0,0.5,len(years))
             return pd.DataFrame({"date":years,"value":vals,"group":group_name}), "예시 데이터"
 
-    co2, src1 = fetch(
-        "https://gml.noaa.gov/webdata/ccgg/trends/co2/co2_mm_mlo.csv",
-        ["year","month","decimal_date","average","interpolated","trend","days"],
-        "CO₂ (ppm)", (370,420), ("2000-01-01","2025-01-01")
-    )
-    o2, src2 = fetch(
-        "https://gml.noaa.gov/webdata/ccgg/trends/o2/o2_alt_surface-flask_allvalid.txt",
-        ["year","month","decimal_date","o2_conc","stdev","n"],
-        "O₂ 변화 (per meg)", (-300,0), ("2000-01-01","2025-01-01")
-    )
-    ch4, src3 = fetch(
-        "https://gml.noaa.gov/webdata/ccgg/trends/ch4/ch4_mm_gl.txt",
-        ["year","month","decimal_date","average","trend","days"],
-        "CH₄ (ppb)", (1750,1950), ("2000-01-01","2025-01-01")
-    )
-    n2o, src4 = fetch(
-        "https://gml.noaa.gov/webdata/ccgg/trends/n2o/n2o_mm_gl.txt",
-        ["year","month","decimal_date","average","trend","days"],
-        "N₂O (ppb)", (315,335), ("2000-01-01","2025-01-01")
-    )
-    gas_data = pd.concat([co2,o2,ch4,n2o])
-    return gas_data, [src1, src2, src3, src4]
+    specs = [
+        ("https://gml.noaa.gov/webdata/ccgg/trends/co2/co2_mm_mlo.csv",
+         ["year","month","decimal_date","average","interpolated","trend","days"],
+         "CO₂ (ppm)", (370,420), ("2000-01-01","2025-01-01")),
+        ("https://gml.noaa.gov/webdata/ccgg/trends/o2/o2_alt_surface-flask_allvalid.txt",
+         ["year","month","decimal_date","o2_conc","stdev","n"],
+         "O₂ 변화 (per meg)", (-300,0), ("2000-01-01","2025-01-01")),
+        ("https://gml.noaa.gov/webdata/ccgg/trends/ch4/ch4_mm_gl.txt",
+         ["year","month","decimal_date","average","trend","days"],
+         "CH₄ (ppb)", (1750,1950), ("2000-01-01","2025-01-01")),
+        ("https://gml.noaa.gov/webdata/ccgg/trends/n2o/n2o_mm_gl.txt",
+         ["year","month","decimal_date","average","trend","days"],
+         "N₂O (ppb)", (315,335), ("2000-01-01","2025-01-01")),
+    ]
+    # 네 요청은 서로 독립적인 I/O이므로 동시에 보냄 (결과는 입력 순서 유지)
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        results = list(ex.map(lambda spec: fetch(*spec), specs))
+    gas_data = pd.concat([df for df, _ in results], ignore_index=True)
+    # 범례 순서를 유지하도록 등장 순서대로 카테고리 지정
+    gas_data["group"] = pd.Categorical(gas_data["group"], categories=gas_data["group"].unique())
+    return gas_data, [src for _, src in results]
+
+# 기간 필터 + 이동 평균 (같은 (start, end, smooth) 조합이면 캐시에서 바로 반환)
+@st.cache_data(max_entries=32)
+def prepare_gas(gas_data, start, end, smooth):
+    start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+    mask = (gas_data["date"] >= start_ts) & (gas_data["date"] <= end_ts)
+    sel = gas_data.loc[mask, ["date","value","group"]].reset_index(drop=True)
+    if smooth > 0:
+        sel["value"] = moving_average(sel["value"], sel["group"].cat.codes.to_numpy(), smooth)
+    return sel
+
+# 가스 차트 (Figure 객체는 피클링 없이 참조로 재사용)
+@st.cache_resource(max_entries=32)
+def gas_figure(gas_data, start, end, smooth):
+    sel = prepare_gas(gas_data, start, end, smooth)
+    return px.line(downsample(sel), x="date", y="value", color="group", render_mode="webgl",
+                   title="대기 성분 농도 변화 (CO₂, O₂, CH₄, N₂O)",
+                   labels={"date":"날짜","value":"값","group":"지표"})
 
 # ---------- 에너지 소비량 (한국, 일본, 중국, 세계) ----------
 @st.cache_data(ttl=3600)
 def load_energy_countries():
+    session = get_session()
     base = "https://api.worldbank.org/v2/country/{code}/indicator/EG.USE.PCAP.KG.OE?format=json"
     def fetch_country(code, name):
         try:
-            r = requests.get(base.format(code=code), timeout=15).json()
-            rows = r[1]
-            df = pd.DataFrame(rows)[["date","value"]].dropna()
-            df["date"] = pd.to_datetime(df["date"])
+            def parse(r):
+                rows = [row for row in r.json()[1] if row["value"] is not None]
+                return pd.DataFrame({
+                    "date": pd.to_datetime([row["date"] for row in rows], format="%Y"),
+                    "value": [row["value"] for row in rows],
+                })
+            df = cached_fetch(base.format(code=code), parse, session)
             df["group"] = name
             return df
         except:
@@ -94,9 +224,11 @@ def load_energy_countries():
         "JPN":"일본 1인당 에너지 사용량",
         "CHN":"중국 1인당 에너지 사용량"
     }
-    df_list = [fetch_country(code,name) for code,name in countries.items()]
-    df = pd.concat(df_list)
-    df = df[df["date"].dt.year >= 2000]
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        df_list = list(ex.map(fetch_country, countries.keys(), countries.values()))
+    df = pd.concat(df_list, ignore_index=True)
+    df["group"] = pd.Categorical(df["group"], categories=df["group"].unique())
+    df = df[df["date"] >= YEAR2000_TS]
     return df, base
 
 # ---------- 대시보드 ----------
@@ -112,21 +244,16 @@ with st.sidebar:
     end = st.date_input("종료일", value=min(TODAY_LOCAL, pd.to_datetime("2025-12-31").date()))
     smooth = st.slider("이동 평균 (개월)", 0, 24, 6)
 
-mask = (gas_data["date"].dt.date >= start) & (gas_data["date"].dt.date <= end)
-sel = gas_data[mask].copy()
-if smooth > 0:
-    sel["value"] = sel.groupby("group")["value"].transform(lambda s: s.rolling(smooth,1).mean())
+sel = prepare_gas(gas_data, start, end, smooth)
 
-fig = px.line(sel, x="date", y="value", color="group",
-              title="대기 성분 농도 변화 (CO₂, O₂, CH₄, N₂O)",
-              labels={"date":"날짜","value":"값","group":"지표"})
+fig = gas_figure(gas_data, start, end, smooth)
 st.plotly_chart(fig, use_container_width=True)
 safe_csv_download(sel, "gas_data.csv")
 
 # 에너지 소비량
 energy, energy_src = load_energy_countries()
 st.subheader("⚡ 한국, 일본, 중국, 세계 1인당 에너지 소비량 (2000~2025)")
-fig2 = px.line(energy, x="date", y="value", color="group", markers=True,
+fig2 = px.line(energy, x="date", y="value", color="group", markers=True, render_mode="webgl",
                title="한국, 일본, 중국, 세계 1인당 에너지 사용량 비교",
                labels={"date":"연도","value":"kg oil eq.","group":"국가/지역"})
 st.plotly_chart(fig2, use_container_width=True)